@@ -29,19 +29,18 @@ def main() -> None:
     ap.add_argument("--load", type=str, default=None, help="Load model from path instead of fitting")
     args = ap.parse_args()
 
-    os.makedirs(p["models_dir"], exist_ok=True)
-
     cfg = load_config(args.config)
     p = cfg["paths"]
+    os.makedirs(p["models_dir"], exist_ok=True)
     k = args.k or cfg["eval"]["default_k"]
     split_path = p["test_parquet"] if args.split == "test" else p["val_parquet"]
 
     m = cfg["models"]["bayesian_m"]
     svd_cfg = cfg["models"]["svd"]
     models = {
-        "popularity_unfiltered": PopularityUnfiltered(),
+        "popularity_unfiltered": PopularityUnfiltered(k),
         "popularity_filtered":   PopularityFiltered(),
-        "bayesian_unfiltered":   PopularityBayesianUnfiltered(m),
+        "bayesian_unfiltered":   PopularityBayesianUnfiltered(m, k),
         "bayesian_filtered":     PopularityBayesianFiltered(m),
         "svd": SVD(
             k=svd_cfg["k"],
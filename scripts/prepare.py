@@ -12,7 +12,7 @@ from __future__ import annotations
 import argparse
 
 from anirec.config import load_config
-from anirec.data.prepare import run
+from anirec.data.prepare import detect_inputs, run
 
 
 def main() -> None:
@@ -23,6 +23,8 @@ def main() -> None:
     cfg = load_config(args.config)
     p = cfg["paths"]
     prep = cfg["prepare"]
+    if not prep.get("ratings_csv"):
+        prep = {**prep, **detect_inputs(p["raw_dir"])}
 
     run(
         ratings_csv=prep["ratings_csv"],
@@ -35,7 +37,9 @@ def main() -> None:
         title_col=prep.get("title_col"),
         genres_col=prep.get("genres_col"),
         sample_n=prep["sample_n"],
+        sample_seed=prep.get("sample_seed", 42),
         threads=prep["threads"],
+        memory_limit=prep.get("memory_limit"),
     )
 
 
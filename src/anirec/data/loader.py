@@ -4,7 +4,41 @@ from __future__ import annotations
 
 from pathlib import Path
 
-import duckdb
+import numpy as np
+
+from anirec.utils.db import get_con
+
+
+def load_user_items(path: str | Path, batch_size: int = 65_536) -> dict[int, set[int]]:
+    """Load a ratings/split Parquet into a ``{user_id: set[item_id]}`` lookup.
+
+    Items are grouped per user inside DuckDB and the result is streamed
+    back in batches of users, so the full set of ``(user, item)`` rows is
+    never materialised as Python tuples at once.
+
+    Parameters
+    ----------
+    path : str | Path
+        Path to a Parquet file with ``user_id`` and ``item_id`` columns.
+    batch_size : int
+        Number of users fetched from DuckDB per batch.
+
+    Returns
+    -------
+    dict[int, set[int]]
+        Mapping from user ID to the set of item IDs they interacted with.
+    """
+    con = get_con()
+    cur = con.execute("""
+        SELECT user_id, list(item_id)
+        FROM read_parquet(?)
+        GROUP BY user_id
+    """, [Path(path).as_posix()])
+    user_items: dict[int, set[int]] = {}
+    while batch := cur.fetchmany(batch_size):
+        for uid, items in batch:
+            user_items[int(uid)] = set(items)
+    return user_items
 
 
 def load_truth(test_path: str | Path) -> dict[int, set[int]]:
@@ -22,16 +56,38 @@ def load_truth(test_path: str | Path) -> dict[int, set[int]]:
     dict[int, set[int]]
         Mapping from user ID to set of ground-truth item IDs.
     """
-    con = duckdb.connect()
-    rows = con.execute(f"""
-        SELECT user_id, item_id
-        FROM read_parquet('{Path(test_path).as_posix()}')
-    """).fetchall()
-    con.close()
-    truth: dict[int, set[int]] = {}
-    for uid, iid in rows:
-        uid, iid = int(uid), int(iid)
-        if uid not in truth:
-            truth[uid] = set()
-        truth[uid].add(iid)
-    return truth
\ No newline at end of file
+    return load_user_items(test_path)
+
+
+def load_ratings_arrays(path: str | Path) -> dict[str, np.ndarray]:
+    """Load ratings as one contiguous NumPy array per column.
+
+    Parquet files go through DuckDB's parallel Parquet scanner; anything
+    else is read with ``read_csv_auto``. Only the three rating columns are
+    projected, and each comes back as its own columnar buffer. Ratings are
+    cast to float32 inside DuckDB, halving their size without an extra
+    NumPy copy.
+
+    Parameters
+    ----------
+    path : str | Path
+        Path to a ratings Parquet or CSV file with ``user_id``,
+        ``item_id`` and ``rating`` columns.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        ``{"user_id": int64, "item_id": int64, "rating": float32}`` arrays
+        of equal length.
+    """
+    path = Path(path)
+    source = "read_parquet(?)" if path.suffix == ".parquet" else "read_csv_auto(?, header=true)"
+    con = get_con()
+    cols = con.execute(f"""
+        SELECT
+            CAST(user_id AS BIGINT) AS user_id,
+            CAST(item_id AS BIGINT) AS item_id,
+            CAST(rating AS FLOAT)   AS rating
+        FROM {source}
+    """, [path.as_posix()]).fetchnumpy()
+    return {name: np.asarray(arr) for name, arr in cols.items()}
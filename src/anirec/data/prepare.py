@@ -2,10 +2,166 @@
 
 from __future__ import annotations
 
+import functools
+import os
+from collections.abc import Iterator
 from pathlib import Path
 
 import duckdb
 
+from anirec.utils.db import get_con
+
+# Lower-cased header spellings seen across MAL / Kaggle dumps, keyed by the
+# ``run`` argument they fill in. Earlier aliases win.
+RATINGS_ALIASES: dict[str, tuple[str, ...]] = {
+    "user_col": ("user_id", "userid", "user", "username"),
+    "item_col": ("anime_id", "animeid", "item_id", "mal_id"),
+    "rating_col": ("rating", "my_score", "score"),
+}
+ITEMS_ALIASES: dict[str, tuple[str, ...]] = {
+    "item_id_col": ("mal_id", "anime_id", "animeid", "item_id"),
+    "title_col": ("name", "title", "english name"),
+    "genres_col": ("genres", "genre"),
+}
+# Frozen copies for the membership test; the tuples above decide ties.
+_RATINGS_SETS = {canon: frozenset(cands) for canon, cands in RATINGS_ALIASES.items()}
+_ITEMS_SETS = {canon: frozenset(cands) for canon, cands in ITEMS_ALIASES.items()}
+_RATINGS_REQUIRED = frozenset(RATINGS_ALIASES)
+_ITEMS_REQUIRED = frozenset({"item_id_col", "title_col"})
+
+
+@functools.lru_cache(maxsize=None)
+def _read_header(path_str: str, mtime_ns: int, size_bytes: int) -> tuple[str, ...]:
+    """Return the header row of a CSV file.
+
+    The header is probed with DuckDB's CSV sniffer on a one-row sample.
+    Files the sniffer cannot read (e.g. not UTF-8) yield an empty header,
+    so they simply never score. ``mtime_ns`` and ``size_bytes`` are only
+    part of the cache key, so a file is re-read once it changes on disk.
+    """
+    try:
+        rows = get_con().execute(
+            "DESCRIBE SELECT * FROM read_csv_auto(?, header=true, sample_size=1)",
+            [path_str],
+        ).fetchall()
+    except duckdb.Error:
+        return ()
+    return tuple(r[0] for r in rows)
+
+
+def _score_header(
+    header: tuple[str, ...],
+    aliases: dict[str, tuple[str, ...]],
+    alias_sets: dict[str, frozenset[str]],
+) -> tuple[int, dict[str, str]]:
+    """Match a CSV header against *aliases*.
+
+    Presence is tested with one set intersection per canonical column
+    against *alias_sets*; if several aliases of one column are present,
+    the earliest in *aliases* wins.
+
+    Returns the number of canonical columns found and a mapping from
+    canonical name to the column name as spelled in the file.
+    """
+    colset = {c.strip().lower(): c for c in header}
+    mapping = {
+        canon: colset[next(c for c in aliases[canon] if c in hits)]
+        for canon, cands in alias_sets.items()
+        if (hits := colset.keys() & cands)
+    }
+    return len(mapping), mapping
+
+
+def _iter_csvs(root: str) -> Iterator[tuple[str, os.stat_result]]:
+    """Yield ``(path, stat)`` for every ``*.csv`` under *root*, recursively.
+
+    Walks with ``os.scandir`` and stats each file through its
+    ``DirEntry``, so there is one stat per file and no ``Path`` objects.
+    Symlinked directories are not followed.
+    """
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_csvs(entry.path)
+            elif entry.name.endswith(".csv") and entry.is_file():
+                yield entry.path, entry.stat()
+
+
+def _find_best_csv(raw_dir: str | Path) -> tuple[dict | None, dict | None]:
+    """Pick the best ratings and items CSVs under *raw_dir* in one sweep.
+
+    Every CSV is stat'ed and its header read once, then scored against
+    both alias sets. Among files that have all required columns, the
+    highest score wins, with ties going to the larger file.
+
+    Returns
+    -------
+    tuple[dict | None, dict | None]
+        ``(ratings, items)``, each ``{"path", "size_bytes", "columns"}``
+        or None when no CSV qualifies.
+    """
+    best: dict[str, tuple] = {}
+    for path, st in sorted(_iter_csvs(os.fspath(raw_dir))):
+        header = _read_header(path, st.st_mtime_ns, st.st_size)
+        for kind, aliases, alias_sets, required in (
+            ("ratings", RATINGS_ALIASES, _RATINGS_SETS, _RATINGS_REQUIRED),
+            ("items", ITEMS_ALIASES, _ITEMS_SETS, _ITEMS_REQUIRED),
+        ):
+            score, mapping = _score_header(header, aliases, alias_sets)
+            if not required <= mapping.keys():
+                continue
+            if kind not in best or (score, st.st_size) > best[kind][:2]:
+                best[kind] = (score, st.st_size, path, mapping)
+
+    def _entry(kind: str) -> dict | None:
+        if kind not in best:
+            return None
+        _, size_bytes, path_str, mapping = best[kind]
+        return {"path": path_str, "size_bytes": size_bytes, "columns": mapping}
+
+    return _entry("ratings"), _entry("items")
+
+
+def _quote_ident(name: str) -> str:
+    """Quote *name* as a SQL identifier, doubling any embedded quotes."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    """Quote *value* as a SQL string literal, doubling any embedded quotes.
+
+    For the spots DuckDB does not accept a bound parameter in: ``COPY …
+    TO`` targets and ``SET`` values.
+    """
+    return "'" + value.replace("'", "''") + "'"
+
+
+def detect_inputs(raw_dir: str | Path) -> dict:
+    """Auto-detect the ratings / items CSVs and their column names.
+
+    Parameters
+    ----------
+    raw_dir : str | Path
+        Directory searched recursively for ``*.csv`` files.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for :func:`run` (``ratings_csv``, ``user_col``,
+        …, and the ``items_*`` arguments). The ``items_*`` values are None
+        when no items CSV is found, so they override any configured ones.
+    """
+    ratings, items = _find_best_csv(raw_dir)
+    if ratings is None:
+        raise FileNotFoundError(f"No ratings CSV found under: {raw_dir}")
+
+    detected = {"ratings_csv": ratings["path"], **ratings["columns"]}
+    detected.update(items_csv=None, item_id_col=None, title_col=None, genres_col=None)
+    if items is not None:
+        detected["items_csv"] = items["path"]
+        detected.update(items["columns"])
+    return detected
+
 
 def run(
     ratings_csv: str,
@@ -18,7 +174,9 @@ def run(
     title_col: str | None = None,
     genres_col: str | None = None,
     sample_n: int = 200_000,
+    sample_seed: int = 42,
     threads: int = 4,
+    memory_limit: str | None = None,
 ) -> None:
     """Convert raw CSVs into cleaned, standardised Parquet files.
 
@@ -44,8 +202,20 @@ def run(
         Column name for genres in the items CSV. Optional.
     sample_n : int
         Number of rows to write to ``ratings_sample.parquet``.
+    sample_seed : int
+        Seed for the reservoir sample.
     threads : int
         DuckDB thread count.
+    memory_limit : str | None
+        DuckDB memory limit (e.g. ``"8GB"``). DuckDB's default is used
+        when None.
+
+    Notes
+    -----
+    ``rating`` is stored as ``TINYINT``; rows whose rating is not a whole
+    number from 1 to 10 are dropped, not rounded. ``ratings.parquet`` is
+    sorted by ``(item_id, user_id, rating)``, so it is identical from run
+    to run, and so is the sample for a given ``sample_seed``.
     """
     ratings_path = Path(ratings_csv)
     if not ratings_path.exists():
@@ -57,70 +227,83 @@ def run(
     print(f"[ratings] using: {ratings_path}")
     print(f"[ratings] columns: user={user_col} item={item_col} rating={rating_col}")
 
+    # A private connection, like split.run: the settings below are for this
+    # bulk job only and must not leak into the shared read connection.
     con = duckdb.connect()
     con.execute(f"PRAGMA threads={int(threads)};")
     con.execute("PRAGMA enable_progress_bar=true;")
+    if memory_limit:
+        con.execute(f"SET memory_limit={_quote_literal(memory_limit)};")
+
+    # Read the source columns as VARCHAR and TRY_CAST them ourselves: the
+    # sniffer then has no types to infer for them, the parallel reader can
+    # be used as-is, and dirty values become NULLs instead of errors.
+    ratings_types = {c: "VARCHAR" for c in (user_col, item_col, rating_col)}
+    user, item, rating = (_quote_ident(c) for c in (user_col, item_col, rating_col))
 
-    con.execute("DROP TABLE IF EXISTS cleaned_ratings;")
+    ratings_out = out_dir / "ratings.parquet"
     con.execute(
         f"""
-        CREATE TABLE cleaned_ratings AS
-        SELECT
-            DENSE_RANK() OVER (ORDER BY u)  AS user_id,
-            TRY_CAST(i AS BIGINT)           AS item_id,
-            TRY_CAST(r AS DOUBLE)           AS rating
-        FROM (
+        COPY (
             SELECT
-                CAST({user_col} AS VARCHAR)  AS u,
-                {item_col}                   AS i,
-                {rating_col}                 AS r
-            FROM read_csv_auto('{ratings_path.as_posix()}', header=true)
+                DENSE_RANK() OVER (ORDER BY u)  AS user_id,
+                item_id,
+                CAST(rating AS TINYINT)         AS rating
+            FROM (
+                SELECT
+                    {user}                        AS u,
+                    TRY_CAST({item} AS BIGINT)    AS item_id,
+                    TRY_CAST({rating} AS DOUBLE)  AS rating
+                FROM read_csv($src, header=true, types=$types, parallel=true)
+            )
+            WHERE u IS NOT NULL
+              AND item_id IS NOT NULL
+              AND rating BETWEEN 1 AND 10
+              AND rating = round(rating)
+            ORDER BY item_id, user_id, rating
         )
-        WHERE u IS NOT NULL
-          AND TRY_CAST(i AS BIGINT) IS NOT NULL
-          AND TRY_CAST(r AS DOUBLE) IS NOT NULL
-          AND r > 0
-        """
+        TO {_quote_literal(ratings_out.as_posix())}
+        (FORMAT PARQUET, COMPRESSION ZSTD);
+        """,
+        {"src": ratings_path.as_posix(), "types": ratings_types},
     )
+    print(f"[write] {ratings_out}")
 
+    # user_id is a dense rank starting at 1, so MAX gives the exact user
+    # count without building a distinct hash table; items are estimated.
     stats = con.execute(
         """
         SELECT
-            COUNT(*)                AS rows,
-            COUNT(DISTINCT user_id) AS users,
-            COUNT(DISTINCT item_id) AS items,
-            MIN(rating)             AS rating_min,
-            MAX(rating)             AS rating_max,
-            AVG(rating)             AS rating_mean
-        FROM cleaned_ratings
-        """
+            COUNT(*)                       AS rows,
+            MAX(user_id)                   AS users,
+            approx_count_distinct(item_id) AS items,
+            MIN(rating)                    AS rating_min,
+            MAX(rating)                    AS rating_max,
+            AVG(rating)                    AS rating_mean
+        FROM read_parquet($src)
+        """,
+        {"src": ratings_out.as_posix()},
     ).fetchone()
     print(
-        f"[ratings] rows={stats[0]:,} users={stats[1]:,} items={stats[2]:,} "
+        f"[ratings] rows={stats[0]:,} users={stats[1]:,} items~{stats[2]:,} "
         f"min={stats[3]} max={stats[4]} mean={float(stats[5]):.4f}"
     )
 
-    ratings_out = out_dir / "ratings.parquet"
-    con.execute(
-        f"""
-        COPY cleaned_ratings
-        TO '{ratings_out.as_posix()}'
-        (FORMAT PARQUET, COMPRESSION ZSTD);
-        """
-    )
-    print(f"[write] {ratings_out}")
-
+    # DuckDB only guarantees a REPEATABLE sample on a single thread.
     sample_out = out_dir / "ratings_sample.parquet"
+    con.execute("PRAGMA threads=1;")
     con.execute(
         f"""
         COPY (
-            SELECT * FROM cleaned_ratings
-            USING SAMPLE {int(sample_n)} ROWS
+            SELECT * FROM read_parquet($src)
+            USING SAMPLE reservoir({int(sample_n)} ROWS) REPEATABLE ({int(sample_seed)})
         )
-        TO '{sample_out.as_posix()}'
+        TO {_quote_literal(sample_out.as_posix())}
         (FORMAT PARQUET, COMPRESSION ZSTD);
-        """
+        """,
+        {"src": ratings_out.as_posix()},
     )
+    con.execute(f"PRAGMA threads={int(threads)};")
     print(f"[write] {sample_out}")
 
     # ── items metadata (optional) ────────────────────────────────────
@@ -135,28 +318,26 @@ def run(
             + (f" genres={genres_col}" if genres_col else "")
         )
 
-        genre_select = f", CAST({genres_col} AS VARCHAR) AS genres" if genres_col else ""
-        con.execute("DROP TABLE IF EXISTS cleaned_items;")
-        con.execute(
-            f"""
-            CREATE TABLE cleaned_items AS
-            SELECT
-                TRY_CAST({item_id_col} AS BIGINT) AS item_id,
-                CAST({title_col} AS VARCHAR)      AS title
-                {genre_select}
-            FROM read_csv_auto('{items_path.as_posix()}', header=true)
-            WHERE TRY_CAST({item_id_col} AS BIGINT) IS NOT NULL
-              AND {title_col} IS NOT NULL
-            """
-        )
-
+        genre_select = f", {_quote_ident(genres_col)} AS genres" if genres_col else ""
+        items_types = {c: "VARCHAR" for c in (item_id_col, title_col, genres_col) if c}
         items_out = out_dir / "items.parquet"
         con.execute(
             f"""
-            COPY cleaned_items
-            TO '{items_out.as_posix()}'
+            COPY (
+                SELECT * FROM (
+                    SELECT
+                        TRY_CAST({_quote_ident(item_id_col)} AS BIGINT) AS item_id,
+                        {_quote_ident(title_col)}                       AS title
+                        {genre_select}
+                    FROM read_csv($src, header=true, types=$types, parallel=true)
+                )
+                WHERE item_id IS NOT NULL
+                  AND title IS NOT NULL
+            )
+            TO {_quote_literal(items_out.as_posix())}
             (FORMAT PARQUET, COMPRESSION ZSTD);
-            """
+            """,
+            {"src": items_path.as_posix(), "types": items_types},
         )
         print(f"[write] {items_out}")
 
@@ -7,16 +7,54 @@ Two variants:
 
 from __future__ import annotations
 
-import duckdb
-
+from anirec.data.loader import load_user_items
 from anirec.models.base import Recommender
+from anirec.utils.db import get_con
+
+# Ranking queries are fixed text built once at import; the train path,
+# prior weight and limit are bound as parameters (``LIMIT NULL`` keeps
+# every row), so every fit issues the same statement.
+_COUNT_RANKING_SQL = """
+    SELECT item_id, COUNT(*) AS cnt
+    FROM read_parquet($path)
+    GROUP BY item_id
+    ORDER BY cnt DESC
+    LIMIT $n
+"""
+
+_BAYES_RANKING_SQL = """
+    SELECT item_id,
+           (COUNT(*) / (COUNT(*) + $m)) * AVG(rating)
+           + ($m     / (COUNT(*) + $m)) * AVG(AVG(rating)) OVER ()
+           AS bayes_score
+    FROM read_parquet($path)
+    GROUP BY item_id
+    ORDER BY bayes_score DESC
+    LIMIT $n
+"""
+
+
+def _rank_items(sql: str, params: dict) -> list[int]:
+    """Run a ranking query on the shared connection and return its item IDs."""
+    rows = get_con().execute(sql, params).fetchall()
+    return [int(r[0]) for r in rows]
 
 
 class PopularityUnfiltered(Recommender):
     """Recommend the global top-*k* items regardless of user history."""
 
-    def __init__(self) -> None:
+    def __init__(self, n: int | None = None) -> None:
+        """
+        Parameters
+        ----------
+        n : int | None
+            Number of top items to keep after fitting. When set, DuckDB
+            evaluates a top-*n* (``ORDER BY … LIMIT n``) instead of sorting
+            every item, and ``recommend`` returns at most *n* items.
+            Defaults to keeping the full ranking.
+        """
         self._top_items: list[int] = []
+        self._n = n
 
     def fit(self, train_path: str) -> None:
         """Compute global item popularity from the training split.
@@ -26,15 +64,9 @@ class PopularityUnfiltered(Recommender):
         train_path : str
             Path to the training Parquet file.
         """
-        con = duckdb.connect()
-        rows = con.execute(f"""
-            SELECT item_id, COUNT(*) AS cnt
-            FROM read_parquet('{train_path}')
-            GROUP BY item_id
-            ORDER BY cnt DESC
-        """).fetchall()
-        con.close()
-        self._top_items = [int(r[0]) for r in rows]
+        self._top_items = _rank_items(
+            _COUNT_RANKING_SQL, {"path": train_path, "n": self._n}
+        )
 
     def recommend(self, user_ids: list[int], k: int) -> dict[int, list[int]]:
         """Return the same global top-*k* for every user.
@@ -69,25 +101,10 @@ class PopularityFiltered(Recommender):
         train_path : str
             Path to the training Parquet file.
         """
-        con = duckdb.connect()
-
-        rows = con.execute(f"""
-            SELECT item_id, COUNT(*) AS cnt
-            FROM read_parquet('{train_path}')
-            GROUP BY item_id
-            ORDER BY cnt DESC
-        """).fetchall()
-        self._top_items = [int(r[0]) for r in rows]
-
-        history = con.execute(f"""
-            SELECT user_id, item_id
-            FROM read_parquet('{train_path}')
-        """).fetchall()
-        con.close()
-
-        self._user_seen = {}
-        for uid, iid in history:
-            self._user_seen.setdefault(int(uid), set()).add(int(iid))
+        self._top_items = _rank_items(
+            _COUNT_RANKING_SQL, {"path": train_path, "n": None}
+        )
+        self._user_seen = load_user_items(train_path)
 
     def recommend(self, user_ids: list[int], k: int) -> dict[int, list[int]]:
         """Return top-*k* popular items the user hasn't seen.
@@ -125,16 +142,22 @@ class PopularityBayesianUnfiltered(Recommender):
     where v = rating count, R = item average, C = global average, m = threshold.
     """
 
-    def __init__(self, m: float = 50.0) -> None:
+    def __init__(self, m: float = 50.0, n: int | None = None) -> None:
         """
         Parameters
         ----------
         m : float
             Bayesian prior weight. Items with fewer than ``m`` ratings are
             pulled toward the global mean. Defaults to 50.
+        n : int | None
+            Number of top items to keep after fitting. When set, DuckDB
+            evaluates a top-*n* (``ORDER BY … LIMIT n``) instead of sorting
+            every item, and ``recommend`` returns at most *n* items.
+            Defaults to keeping the full ranking.
         """
         self._top_items: list[int] = []
         self._m = m
+        self._n = n
 
     def fit(self, train_path: str) -> None:
         """Compute Bayesian average scores from the training split.
@@ -144,19 +167,9 @@ class PopularityBayesianUnfiltered(Recommender):
         train_path : str
             Path to the training Parquet file.
         """
-        m = self._m
-        con = duckdb.connect()
-        rows = con.execute(f"""
-            SELECT item_id,
-                   (COUNT(*) / (COUNT(*) + {m})) * AVG(rating)
-                   + ({m}    / (COUNT(*) + {m})) * AVG(AVG(rating)) OVER ()
-                   AS bayes_score
-            FROM read_parquet('{train_path}')
-            GROUP BY item_id
-            ORDER BY bayes_score DESC
-        """).fetchall()
-        con.close()
-        self._top_items = [int(r[0]) for r in rows]
+        self._top_items = _rank_items(
+            _BAYES_RANKING_SQL, {"path": train_path, "m": self._m, "n": self._n}
+        )
 
     def recommend(self, user_ids: list[int], k: int) -> dict[int, list[int]]:
         """Return the same global top-*k* by Bayesian score for every user.
@@ -199,29 +212,10 @@ class PopularityBayesianFiltered(Recommender):
         train_path : str
             Path to the training Parquet file.
         """
-        m = self._m
-        con = duckdb.connect()
-
-        rows = con.execute(f"""
-            SELECT item_id,
-                   (COUNT(*) / (COUNT(*) + {m})) * AVG(rating)
-                   + ({m}    / (COUNT(*) + {m})) * AVG(AVG(rating)) OVER ()
-                   AS bayes_score
-            FROM read_parquet('{train_path}')
-            GROUP BY item_id
-            ORDER BY bayes_score DESC
-        """).fetchall()
-        self._top_items = [int(r[0]) for r in rows]
-
-        history = con.execute(f"""
-            SELECT user_id, item_id
-            FROM read_parquet('{train_path}')
-        """).fetchall()
-        con.close()
-
-        self._user_seen = {}
-        for uid, iid in history:
-            self._user_seen.setdefault(int(uid), set()).add(int(iid))
+        self._top_items = _rank_items(
+            _BAYES_RANKING_SQL, {"path": train_path, "m": self._m, "n": None}
+        )
+        self._user_seen = load_user_items(train_path)
 
     def recommend(self, user_ids: list[int], k: int) -> dict[int, list[int]]:
         """Return top-*k* Bayesian-scored items the user hasn't seen.
@@ -11,6 +11,7 @@ import numpy as np
 import pickle
 import numba
 
+from anirec.data.loader import load_ratings_arrays
 from anirec.models.base import Recommender
 
 
@@ -109,12 +110,12 @@ class SVD(Recommender):
             Path to the training Parquet file.
         """
         ratings = self._load_ratings(train_path)
-        self._build_maps(ratings)
+        ratings_idx = self._build_maps(ratings)
         P, Q, b_u, b_i, mu = self._init_matrices(
             len(self._user_map), len(self._item_map), ratings
         )
         self.P, self.Q, self.b_u, self.b_i, self.mu = self._train(
-            ratings, P, Q, b_u, b_i, mu
+            ratings_idx, P, Q, b_u, b_i, mu
         )
 
     def recommend(self, user_ids: list[int], k: int) -> dict[int, list[int]]:
@@ -138,9 +139,18 @@ class SVD(Recommender):
                 results[uid] = []
                 continue
             u = self._user_map[uid]
-            predictions = self.mu + self.b_u[u] + self.b_i + self.P[u] @ self.Q.T
+            # One allocation for the dot product, then in-place adds, rather
+            # than a fresh temporary per ``+``.
+            predictions = self.Q @ self.P[u]
+            predictions += self.b_i
+            predictions += self.mu + self.b_u[u]
             predictions[list(self._user_seen[u])] = -np.inf
-            top_k_indices = np.argsort(predictions)[-k:][::-1]
+            # Select the top k with a linear-time partition, then sort just those.
+            if k < len(predictions):
+                top = np.argpartition(predictions, -k)[-k:]
+            else:
+                top = np.arange(len(predictions))
+            top_k_indices = top[np.argsort(predictions[top])[::-1]]
             results[uid] = [self._item_map_reverse[i] for i in top_k_indices]
         return results
 
@@ -183,33 +193,42 @@ class SVD(Recommender):
         self._user_seen = maps["user_seen"]
         self.mu = maps["mu"]
 
-    def _load_ratings(self, train_path: str) -> np.ndarray:
-        """Load ratings from Parquet, return as np array of shape (n, 3)."""
-        import duckdb
-        con = duckdb.connect()
-        rows = con.execute(f"""
-            SELECT user_id, item_id, rating
-            FROM read_parquet('{train_path}')
-        """).fetchall()
-        con.close()
-        return np.array(rows, dtype=np.float32)
-
-    def _build_maps(self, ratings: np.ndarray) -> None:
-        """Build _user_map, _item_map, _item_map_reverse, and _user_seen."""
-        user_ids = sorted(set(int(x) for x in ratings[:, 0]))
-        item_ids = sorted(set(int(x) for x in ratings[:, 1]))
-        self._user_map = {uid: idx for idx, uid in enumerate(user_ids)}
-        self._item_map = {iid: idx for idx, iid in enumerate(item_ids)}
+    def _load_ratings(self, train_path: str) -> dict[str, np.ndarray]:
+        """Load ratings from Parquet as user_id / item_id / rating arrays."""
+        return load_ratings_arrays(train_path)
+
+    def _build_maps(self, ratings: dict[str, np.ndarray]) -> np.ndarray:
+        """Build _user_map, _item_map, _item_map_reverse, and _user_seen.
+
+        A single ``np.unique`` pass per column yields both the sorted
+        original IDs and every row's 0-based index, so no per-row Python
+        lookups are needed.
+
+        Returns
+        -------
+        np.ndarray
+            Shape (n, 3) float64 array of user index, item index, rating,
+            ready for _sgd_loop.
+        """
+        user_ids, u_idx = np.unique(ratings["user_id"], return_inverse=True)
+        item_ids, i_idx = np.unique(ratings["item_id"], return_inverse=True)
+        self._user_map = {uid: idx for idx, uid in enumerate(user_ids.tolist())}
+        self._item_map = {iid: idx for idx, iid in enumerate(item_ids.tolist())}
         self._item_map_reverse = {idx: iid for iid, idx in self._item_map.items()}
-        for row in ratings:
-            u = self._user_map[int(row[0])]
-            i = self._item_map[int(row[1])]
-            if u not in self._user_seen:
-                self._user_seen[u] = set()
-            self._user_seen[u].add(i)
+
+        # Every user index has at least one rating, so grouping the item
+        # indices by sorted user index gives one chunk per user, in order.
+        order = np.argsort(u_idx, kind="stable")
+        bounds = np.flatnonzero(np.diff(u_idx[order])) + 1
+        self._user_seen = {
+            u: set(items.tolist())
+            for u, items in enumerate(np.split(i_idx[order], bounds))
+        }
+
+        return np.column_stack([u_idx, i_idx, ratings["rating"]]).astype(np.float64, copy=False)
 
     def _init_matrices(
-        self, num_users: int, num_items: int, ratings: np.ndarray
+        self, num_users: int, num_items: int, ratings: dict[str, np.ndarray]
     ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, float]:
         """Initialise P, Q, bias vectors, and global mean.
 
@@ -219,42 +238,38 @@ class SVD(Recommender):
             Number of unique users in training.
         num_items : int
             Number of unique items in training.
-        ratings : np.ndarray
-            Full training ratings array, used to compute global mean.
+        ratings : dict[str, np.ndarray]
+            Training rating columns, used to compute global mean.
         """
         P = np.random.normal(0, 0.01, (num_users, self.k))
         Q = np.random.normal(0, 0.01, (num_items, self.k))
         b_u = np.zeros(num_users, dtype=np.float64)
         b_i = np.zeros(num_items, dtype=np.float64)
-        mu = float(ratings[:, 2].mean())
+        mu = float(ratings["rating"].mean())
         return P, Q, b_u, b_i, mu
 
     def _train(
         self,
-        ratings: np.ndarray,
+        ratings_idx: np.ndarray,
         P: np.ndarray,
         Q: np.ndarray,
         b_u: np.ndarray,
         b_i: np.ndarray,
         mu: float,
     ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, float]:
-        """Pre-convert ratings to integer indices, then run SGD for all epochs.
+        """Run SGD for all epochs over index-mapped ratings.
 
-        Builds a float64 array with user and item columns mapped to clean
-        0-based indices via _user_map and _item_map. Each epoch shuffles
-        a copy of this array and delegates to the Numba-compiled _sgd_loop.
+        ``ratings_idx`` is the float64 array from _build_maps, with user
+        and item columns already mapped to clean 0-based indices. Each
+        epoch shuffles it in place, since SGD only needs a fresh order,
+        and delegates to the Numba-compiled _sgd_loop.
 
         Returns fitted (P, Q, b_u, b_i, mu).
         """
-        ratings_idx = np.array(
-            [[self._user_map[int(row[0])], self._item_map[int(row[1])], row[2]] for row in ratings],
-            dtype=np.float64
-        )       
         for epoch in range(self.num_epochs):
-            temp_ratings = ratings_idx.copy()
-            np.random.shuffle(temp_ratings)
+            np.random.shuffle(ratings_idx)
             print(f"[train] epoch {epoch + 1}/{self.num_epochs}")
-            P, Q, b_u, b_i = _sgd_loop(temp_ratings, P, Q, b_u, b_i, mu, self.lr, self.lambda_)
+            P, Q, b_u, b_i = _sgd_loop(ratings_idx, P, Q, b_u, b_i, mu, self.lr, self.lambda_)
         return P, Q, b_u, b_i, mu
     
 
@@ -0,0 +1,35 @@
+"""Process-wide DuckDB connection.
+
+Opening a connection per query pays for thread-pool start-up and catalog
+setup every time, and throws away cached Parquet metadata. Modules that
+only read Parquet/CSV files share this one connection instead.
+"""
+
+from __future__ import annotations
+
+import os
+
+import duckdb
+
+_CON: duckdb.DuckDBPyConnection | None = None
+
+
+def get_con() -> duckdb.DuckDBPyConnection:
+    """Return the shared DuckDB connection, creating it on first use.
+
+    The connection starts with one thread per CPU and the object cache
+    enabled, so Parquet metadata stays hot across queries. Its settings
+    are never changed after that; jobs that need their own (thread count,
+    memory limit, ...) open a private connection instead.
+
+    Returns
+    -------
+    duckdb.DuckDBPyConnection
+        The shared connection. Callers must not close it.
+    """
+    global _CON
+    if _CON is None:
+        _CON = duckdb.connect()
+        _CON.execute(f"PRAGMA threads={os.cpu_count() or 1};")
+        _CON.execute("PRAGMA enable_object_cache=true;")
+    return _CON
@@ -0,0 +1,191 @@
+"""Tests for raw CSV auto-detection in ``anirec.data.prepare``."""
+
+from __future__ import annotations
+
+import duckdb
+import pytest
+
+from anirec.data.prepare import (
+    ITEMS_ALIASES,
+    RATINGS_ALIASES,
+    _ITEMS_SETS,
+    _RATINGS_SETS,
+    _find_best_csv,
+    _score_header,
+    detect_inputs,
+    run,
+)
+from anirec.utils.db import get_con
+
+# Headers as shipped in the andrewgatchalian/myanimelist-user-ratings dump.
+MAL_ANIME_HEADER = (
+    "MAL_ID", "Name", "Score", "Genres", "English name", "Japanese name",
+    "Type", "Episodes", "Aired", "Premiered", "Producers", "Licensors",
+    "Studios", "Source", "Duration", "Rating", "Ranked", "Popularity",
+    "Members", "Favorites", "Watching", "Completed", "On-Hold", "Dropped",
+    "Plan to Watch", "Score-10", "Score-9", "Score-8", "Score-7", "Score-6",
+    "Score-5", "Score-4", "Score-3", "Score-2", "Score-1",
+)
+MAL_ANIMELIST_HEADER = (
+    "user_id", "anime_id", "rating", "watching_status", "watched_episodes",
+)
+
+
+def _write_csv(path, header, rows=()):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [",".join(header)] + [",".join(map(str, r)) for r in rows]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_score_header_mal_anime_items():
+    score, mapping = _score_header(MAL_ANIME_HEADER, ITEMS_ALIASES, _ITEMS_SETS)
+    assert score == 3
+    assert mapping == {"item_id_col": "MAL_ID", "title_col": "Name", "genres_col": "Genres"}
+
+
+def test_score_header_mal_anime_is_not_a_ratings_file():
+    score, mapping = _score_header(MAL_ANIME_HEADER, RATINGS_ALIASES, _RATINGS_SETS)
+    assert "user_col" not in mapping
+    assert score < len(RATINGS_ALIASES)
+
+
+def test_score_header_mal_animelist_ratings():
+    score, mapping = _score_header(MAL_ANIMELIST_HEADER, RATINGS_ALIASES, _RATINGS_SETS)
+    assert score == 3
+    assert mapping == {"user_col": "user_id", "item_col": "anime_id", "rating_col": "rating"}
+
+
+def test_score_header_prefers_earlier_alias():
+    header = ("anime_id", "MAL_ID", "Title", "Name")
+    _, mapping = _score_header(header, ITEMS_ALIASES, _ITEMS_SETS)
+    assert mapping["item_id_col"] == "MAL_ID"
+    assert mapping["title_col"] == "Name"
+
+
+def test_find_best_csv_picks_mal_files(tmp_path):
+    _write_csv(tmp_path / "anime.csv", MAL_ANIME_HEADER, [range(len(MAL_ANIME_HEADER))])
+    _write_csv(tmp_path / "animelist.csv", MAL_ANIMELIST_HEADER, [(1, 2, 8, 2, 12)] * 50)
+    _write_csv(tmp_path / "sub" / "rating_complete.csv", ("user_id", "anime_id", "rating"), [(1, 2, 8)])
+    _write_csv(tmp_path / "junk.csv", ("a", "b"))
+
+    ratings, items = _find_best_csv(tmp_path)
+
+    # both ratings files score 3; the larger one wins
+    assert ratings["path"] == str(tmp_path / "animelist.csv")
+    assert ratings["size_bytes"] == (tmp_path / "animelist.csv").stat().st_size
+    assert items["path"] == str(tmp_path / "anime.csv")
+    assert items["columns"]["title_col"] == "Name"
+
+
+def test_find_best_csv_rereads_changed_header(tmp_path):
+    path = _write_csv(tmp_path / "r.csv", ("user_id", "anime_id", "rating"))
+    assert _find_best_csv(tmp_path)[0] is not None
+
+    _write_csv(path, ("user_id", "anime_id", "watched_episodes", "status"))
+    assert _find_best_csv(tmp_path)[0] is None
+
+
+def test_find_best_csv_skips_unreadable_csv(tmp_path):
+    _write_csv(tmp_path / "animelist.csv", MAL_ANIMELIST_HEADER)
+    (tmp_path / "latin1.csv").write_bytes("user_id,anime_id,rating,c\xf4t\xe9\n1,2,8,x\n".encode("latin-1"))
+
+    ratings, items = _find_best_csv(tmp_path)
+
+    assert ratings["path"] == str(tmp_path / "animelist.csv")
+    assert items is None
+
+
+def test_detect_inputs_builds_run_kwargs(tmp_path):
+    _write_csv(tmp_path / "anime.csv", MAL_ANIME_HEADER)
+    _write_csv(tmp_path / "animelist.csv", MAL_ANIMELIST_HEADER)
+
+    detected = detect_inputs(tmp_path)
+
+    assert detected == {
+        "ratings_csv": str(tmp_path / "animelist.csv"),
+        "user_col": "user_id",
+        "item_col": "anime_id",
+        "rating_col": "rating",
+        "items_csv": str(tmp_path / "anime.csv"),
+        "item_id_col": "MAL_ID",
+        "title_col": "Name",
+        "genres_col": "Genres",
+    }
+
+
+def test_detect_inputs_without_items_clears_item_kwargs(tmp_path):
+    _write_csv(tmp_path / "animelist.csv", MAL_ANIMELIST_HEADER)
+    configured = {"items_csv": "data/raw/anime.csv", "item_id_col": "MAL_ID",
+                  "title_col": "Name", "genres_col": "Genres"}
+
+    merged = {**configured, **detect_inputs(tmp_path)}
+
+    assert merged["ratings_csv"] == str(tmp_path / "animelist.csv")
+    assert all(merged[k] is None for k in configured)
+
+
+def test_detect_inputs_without_ratings_raises(tmp_path):
+    _write_csv(tmp_path / "anime.csv", MAL_ANIME_HEADER)
+    with pytest.raises(FileNotFoundError):
+        detect_inputs(tmp_path)
+
+
+def test_run_leaves_shared_connection_settings_alone(tmp_path):
+    csv = _write_csv(tmp_path / "r.csv", MAL_ANIMELIST_HEADER, [(1, 2, 8, 2, 12), (2, 3, 7, 2, 1)])
+    con = get_con()
+    before = con.execute(
+        "SELECT current_setting('threads'), current_setting('preserve_insertion_order'),"
+        " current_setting('memory_limit')"
+    ).fetchone()
+
+    run(str(csv), "user_id", "anime_id", "rating", out_dir=str(tmp_path / "out"),
+        sample_n=1, threads=1, memory_limit="256MB")
+
+    after = con.execute(
+        "SELECT current_setting('threads'), current_setting('preserve_insertion_order'),"
+        " current_setting('memory_limit')"
+    ).fetchone()
+    assert after == before
+
+
+def test_run_keeps_only_whole_ratings_in_range(tmp_path):
+    csv = _write_csv(
+        tmp_path / "r.csv",
+        ("user_id", "anime_id", "rating"),
+        [("a", 1, 0), ("a", 2, 7.6), ("a", 3, 11), ("a", 4, '"8.0"'),
+         ("a", 5, "abc"), ("b", 1, 1), ("b", 2, 10)],
+    )
+    out = tmp_path / "out"
+
+    run(str(csv), "user_id", "anime_id", "rating", out_dir=str(out), sample_n=1)
+
+    ratings = (out / "ratings.parquet").as_posix()
+    rows = duckdb.sql(f"SELECT user_id, item_id, rating FROM '{ratings}'").fetchall()
+    assert rows == [(2, 1, 1), (2, 2, 10), (1, 4, 8)]
+    schema = duckdb.sql(f"DESCRIBE SELECT * FROM '{ratings}'").fetchall()
+    assert [(r[0], r[1]) for r in schema] == [
+        ("user_id", "BIGINT"), ("item_id", "BIGINT"), ("rating", "TINYINT"),
+    ]
+
+
+def test_run_output_is_identical_across_runs_and_threads(tmp_path):
+    # Enough rows for several row groups, with duplicate (user, item) pairs.
+    rows = [(f"u{i % 500}", i % 300, 1 + i // 1500 % 10) for i in range(300_000)]
+    csv = _write_csv(tmp_path / "r.csv", ("user_id", "anime_id", "rating"), rows)
+
+    outputs = []
+    for threads in (1, 4):
+        out = tmp_path / f"out{threads}"
+        run(str(csv), "user_id", "anime_id", "rating", out_dir=str(out),
+            sample_n=1_000, threads=threads)
+        outputs.append([
+            duckdb.sql(f"SELECT * FROM '{(out / name).as_posix()}'").fetchall()
+            for name in ("ratings.parquet", "ratings_sample.parquet")
+        ])
+
+    (ratings_a, sample_a), (ratings_b, sample_b) = outputs
+    assert len(ratings_a) == len(rows)
+    assert ratings_a == ratings_b
+    assert len(sample_a) == 1_000
+    assert sorted(sample_a) == sorted(sample_b)